@@ -1,9 +1,10 @@
-import json
+import asyncio
 import logging
 
+import orjson
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv()
@@ -15,8 +16,9 @@ logging.basicConfig(
 # Create a logger
 logger = logging.getLogger(__name__)
 
-from utils import safe_read
-from llm import ask_llm
+from base import ToolStatus
+from utils import safe_iter_chunks
+from llm import accept_completion, ask_llm_async
 import tools.phaseA as phaseATools
 import tools.phaseB as phaseBTools
 
@@ -47,6 +49,7 @@ tools = [
         phaseBTools.CodeRunnerTool,
     ]
 ]
+tools_by_name = {tool.name: tool for tool in tools}
 
 
 @app.get("/", response_class=PlainTextResponse)
@@ -87,7 +90,7 @@ async def run_task(task: str):
             {"role": "user", "content": task},
         ]
         tools_pool = tools
-        response = ask_llm(messages, tools_pool)
+        response = await ask_llm_async(messages, tools_pool)
         message = response.choices[0].message
         if not hasattr(message, "tool_calls") or not message.tool_calls:
             # If no tool calls, return the message content as error
@@ -97,13 +100,21 @@ async def run_task(task: str):
         task_code = tool_call.name
         arguments = tool_call.arguments
 
-        for tool in tools_pool:
-            if tool.name == task_code:
-                logger.info(f"Calling Tool : {tool.name} with arguments {arguments}")
-                tool_response = tool.run(**json.loads(arguments))
-                logger.info(f"We got ToolResponse {tool_response}")
-                return PlainTextResponse(str(tool_response.__dict__))
-
+        tool = tools_by_name.get(task_code)
+        if tool is None:
+            raise HTTPException(status_code=400, detail=f"Unknown tool {task_code}")
+
+        logger.info(f"Calling Tool : {tool.name} with arguments {arguments}")
+        # Tools are blocking, keep them off the event loop
+        tool_response = await asyncio.to_thread(tool.run, **orjson.loads(arguments))
+        logger.info(f"We got ToolResponse {tool_response}")
+        if tool_response.status == ToolStatus.SUCCESS:
+            accept_completion(messages, tools_pool, response)
+        return PlainTextResponse(str(tool_response.__dict__))
+
+    except HTTPException:
+        # Already carries the right status and detail, don't wrap it again
+        raise
     except Exception as e:
         logger.error("error occurred", exc_info=e)
         raise HTTPException(status_code=400, detail=str(e))
@@ -113,14 +124,33 @@ async def run_task(task: str):
 @app.get("/read", response_class=PlainTextResponse)
 async def read_file(path: str = Query(..., description="File path to read")):
     try:
-        return safe_read(path)
+        # Open eagerly so a missing file still maps to a 404
+        chunks = safe_iter_chunks(path)
+        first_chunk = next(chunks, b"")
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error : {str(e)}")
 
+    def stream():
+        yield first_chunk
+        yield from chunks
+
+    return StreamingResponse(stream(), media_type="text/plain")
+
 
 if __name__ == "__main__":
+    import os
+
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Multiple workers need the app as an import string
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1)),
+        log_level="info",
+    )
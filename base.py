@@ -19,8 +19,15 @@ class ToolResponse(BaseModel):
 class BaseTool(ABC):
     """Interface for all agents. All agents should inherit from this class."""
 
+    # Inferred parameters per tool class, the schema never changes at runtime
+    _inferred_parameters: dict[type, dict] = {}
+
     def get_parameters(self):
         """Return the automatically inferred parameters for the function using the dcstring of the function."""
+        tool_class = type(self)
+        if tool_class in BaseTool._inferred_parameters:
+            return BaseTool._inferred_parameters[tool_class]
+
         function_inferrer = FunctionInferrer.infer_from_function_reference(self.run)
         function_json = function_inferrer.to_json_schema()
         parameters = function_json.get("parameters")
@@ -28,6 +35,7 @@ class BaseTool(ABC):
             raise Exception(
                 "Failed to infere parameters, please define JSON instead of using this automated util."
             )
+        BaseTool._inferred_parameters[tool_class] = parameters
         return parameters
 
     def to_llm_format(self):
@@ -41,6 +49,11 @@ class BaseTool(ABC):
             },
         }
 
+    @property
+    def parameters(self):
+        # Tools that don't define a parameters schema fall back to inference
+        return self.get_parameters()
+
     @property
     def name(self):
         return self.agent_name
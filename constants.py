@@ -1,3 +1,14 @@
 DEFAULT_EMAIL = "22f2001394@ds.study.iitm.ac.in"
 DATAGEN_SCRIPT_URL = "https://raw.githubusercontent.com/sanand0/tools-in-data-science-public/tds-2025-01/project-1/datagen.py"
-CODE_RUNNER_MAX_ITERATIONS = 10 
+CODE_RUNNER_MAX_ITERATIONS = 10
+EMBEDDING_BATCH_SIZE = 256
+SIMILARITY_BLOCK_SIZE = 512
+HTTP_MAX_CONNECTIONS = 100
+HTTP_TIMEOUT = 60
+LLM_CACHE_SIZE = 1024
+IO_MAX_WORKERS = 32
+SUBPROCESS_OUTPUT_TAIL_LINES = 200
+EMAIL_HEADER_SCAN_BYTES = 65536
+EMBEDDING_CACHE_SIZE = 4096
+MMAP_MIN_BYTES = 65536
+CODE_RUNNER_SETUP_CACHE_FILE = "/tmp/coderunner_setup.lst"
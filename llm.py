@@ -1,6 +1,15 @@
+import array
+import asyncio
+import functools
+import hashlib
+import json
 import os
+
+import httpx
 import openai
+import constants
 from base import BaseTool
+from utils import LRUCache
 from dotenv import load_dotenv
 import logging
 
@@ -23,7 +32,58 @@ logger.info(
     f"Using {model_name} and {embedding_model} via {'Gemini' if os.getenv('GEMINI_TOKEN') else 'OpenAI Proxy'}"
 )
 
-openai_client = openai.OpenAI(api_key=api_key, base_url=api_base)
+# Shared, pooled HTTP clients so keep-alive connections are reused across calls
+http_limits = httpx.Limits(
+    max_connections=constants.HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=constants.HTTP_MAX_CONNECTIONS,
+)
+http_client = httpx.Client(
+    http2=True, limits=http_limits, timeout=constants.HTTP_TIMEOUT
+)
+async_http_client = httpx.AsyncClient(
+    http2=True, limits=http_limits, timeout=constants.HTTP_TIMEOUT
+)
+
+openai_client = openai.OpenAI(
+    api_key=api_key, base_url=api_base, http_client=http_client
+)
+async_openai_client = openai.AsyncOpenAI(
+    api_key=api_key, base_url=api_base, http_client=async_http_client
+)
+
+
+@functools.cache
+def tools_llm_format(tools: tuple[BaseTool, ...]) -> list[dict]:
+    """Build the LLM tool schemas once per tool set, they never change at runtime."""
+    return [tool.to_llm_format() for tool in tools]
+
+
+# LRU of completions keyed by a hash of the request, avoids re-asking identical prompts.
+# Only completions a caller accepted are stored, so failed attempts can be retried
+completion_cache = LRUCache(constants.LLM_CACHE_SIZE)
+
+# LRU of embeddings keyed by input text, only novel inputs hit the API.
+# Vectors are stored as float32 arrays (~6 KB each) instead of lists of floats
+embedding_cache = LRUCache(constants.EMBEDDING_CACHE_SIZE)
+
+
+def completion_cache_key(messages: list, tools: list[BaseTool]) -> str:
+    # Tool schemas are static for the process lifetime, so names identify them
+    payload = json.dumps(
+        [model_name, [tool.name for tool in tools], messages],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def accept_completion(messages: list, tools: list[BaseTool], response):
+    """Cache a completion once the caller has used it successfully."""
+    completion_cache.put(completion_cache_key(messages, tools), response)
+
+
+# Completions currently in flight, concurrent identical requests share one call
+inflight_completions = {}
 
 
 def ask_llm(messages: list = [], tools: list[BaseTool] = []):
@@ -33,13 +93,61 @@ def ask_llm(messages: list = [], tools: list[BaseTool] = []):
     }
 
     if tools:
-        kwargs["tools"] = [tool.to_llm_format() for tool in tools]
+        kwargs["tools"] = tools_llm_format(tuple(tools))
         kwargs["tool_choice"] = "auto"
 
+    key = completion_cache_key(messages, tools)
+    response = completion_cache.get(key)
+    if response is not None:
+        logger.info("LLM cache hit")
+        return response
+
     response = openai_client.chat.completions.create(**kwargs)
     return response
 
 
-def get_embedding(inputs: list):
-    response = openai_client.embeddings.create(input=inputs, model=embedding_model)
+async def ask_llm_async(messages: list = [], tools: list[BaseTool] = []):
+    kwargs = {
+        "model": model_name,
+        "messages": messages,
+    }
+
+    if tools:
+        kwargs["tools"] = tools_llm_format(tuple(tools))
+        kwargs["tool_choice"] = "auto"
+
+    key = completion_cache_key(messages, tools)
+    response = completion_cache.get(key)
+    if response is not None:
+        logger.info("LLM cache hit")
+        return response
+
+    if key in inflight_completions:
+        logger.info("Joining in-flight LLM request")
+        return await asyncio.shield(inflight_completions[key])
+
+    task = asyncio.ensure_future(async_openai_client.chat.completions.create(**kwargs))
+    inflight_completions[key] = task
+    try:
+        response = await asyncio.shield(task)
+    finally:
+        inflight_completions.pop(key, None)
     return response
+
+
+def get_embedding(inputs: list) -> list[array.array]:
+    """Embed all inputs, batching them to keep the number of API calls small."""
+    embeddings = {text: embedding_cache.get(text) for text in inputs}
+    missing = [text for text, embedding in embeddings.items() if embedding is None]
+
+    batch_size = constants.EMBEDDING_BATCH_SIZE
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start : start + batch_size]
+        response = openai_client.embeddings.create(input=batch, model=embedding_model)
+        # Match results back to inputs by index
+        for item in response.data:
+            embedding = array.array("f", item.embedding)
+            embeddings[batch[item.index]] = embedding
+            embedding_cache.put(batch[item.index], embedding)
+
+    return [embeddings[text] for text in inputs]
@@ -1,26 +1,101 @@
-import json
+import functools
+import heapq
 import logging
 import os
+import re
 import shutil
 import sqlite3
 import subprocess
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from operator import itemgetter
 from pathlib import Path
 
 import constants
-import numpy as np
-import requests
+import orjson
 from base import BaseTool, ToolResponse, ToolStatus
-from dateutil.parser import parse
 from dotenv import load_dotenv
-from llm import ask_llm, get_embedding
-from utils import png_to_base64, safe_path, safe_read, safe_write
+from llm import accept_completion, ask_llm, get_embedding
+from utils import (
+    io_worker_count,
+    png_to_data_url,
+    read_first_line,
+    read_markdown_title,
+    resolve_executable,
+    safe_path,
+    safe_read,
+    safe_read_mmap,
+    safe_write,
+    safe_write_bytes,
+)
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 
+# A From: header including any folded continuation lines
+FROM_HEADER_RE = re.compile(rb"(?mi)^From:[^\r\n]*(?:\r?\n[ \t][^\r\n]*)*")
+HEADER_FOLD_RE = re.compile(r"\r?\n[ \t]+")
+# Headers end at the first blank line
+HEADER_END_RE = re.compile(rb"\r?\n\r?\n")
+EMAIL_ADDRESS = r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}"
+# An address in angle brackets wins over one that appears in the display name
+ANGLE_ADDRESS_RE = re.compile(rf"<\s*({EMAIL_ADDRESS})\s*>")
+BARE_ADDRESS_RE = re.compile(rf"({EMAIL_ADDRESS})")
+
+
+# A file made only of YYYY-MM-DD lines
+ISO_DATES_RE = re.compile(r"(?:\d{4}-\d{2}-\d{2}\n)*\d{4}-\d{2}-\d{2}")
+
+# Known date formats, kept in most-recently-matched order
+DATE_FORMATS = ["%Y-%m-%d", "%d-%b-%Y", "%b %d, %Y", "%Y/%m/%d %H:%M:%S"]
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_weekday(date: str) -> int:
+    """Return the weekday of a date, trying known formats before dateutil."""
+    # Fast path for ISO dates, slicing is much cheaper than strptime
+    if len(date) == 10 and date[4] == "-" == date[7]:
+        try:
+            return datetime(int(date[0:4]), int(date[5:7]), int(date[8:10])).weekday()
+        except ValueError:
+            pass
+
+    for index, date_format in enumerate(DATE_FORMATS):
+        try:
+            parsed_date = datetime.strptime(date, date_format)
+        except ValueError:
+            continue
+        if index:
+            DATE_FORMATS.insert(0, DATE_FORMATS.pop(index))
+        return parsed_date.weekday()
+
+    # Imported lazily, only needed for formats we don't know about
+    from dateutil.parser import parse
+
+    return parse(date).weekday()
+
+
+@functools.lru_cache(maxsize=32)
+def sqlite_connection(db_path: str, mtime_ns: int) -> sqlite3.Connection:
+    """Open a cached read-only connection, keyed on mtime so rewritten files reopen."""
+    conn = sqlite3.connect(
+        f"{Path(db_path).resolve().as_uri()}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+        # Repeated queries reuse their prepared statements from this cache
+        cached_statements=256,
+    )
+    conn.execute("PRAGMA query_only=1")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
 class A1Tool(BaseTool):
     name = "A1"
     description = (
@@ -58,15 +133,31 @@ class A1Tool(BaseTool):
 
         logger.info(f"Saving data at {save_at}")
         try:
-            cmd = ["uv", "run", script_url, email, "--root", save_at]
+            cmd = [
+                resolve_executable("uv"),
+                "run",
+                script_url,
+                email,
+                "--root",
+                save_at,
+            ]
             logger.info(f"Running cmd  {' '.join(cmd)}")
             process = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
             )
-            stdout, stderr = process.communicate()
-            if process.returncode != 0:
-                return ToolResponse(status=ToolStatus.ERROR, message=f"Error: {stderr}")
-            return ToolResponse(status=ToolStatus.SUCCESS, data={"output": stdout})
+            # Stream output to the log as it arrives, keeping only the tail
+            tail = deque(maxlen=constants.SUBPROCESS_OUTPUT_TAIL_LINES)
+            for line in process.stdout:
+                logger.info(line.rstrip())
+                tail.append(line)
+            output = "".join(tail)
+            if process.wait() != 0:
+                return ToolResponse(status=ToolStatus.ERROR, message=f"Error: {output}")
+            return ToolResponse(status=ToolStatus.SUCCESS, data={"output": output})
         except Exception as e:
             return ToolResponse(status=ToolStatus.ERROR, message=f"Error: {e}")
 
@@ -105,7 +196,7 @@ class A2Tool(BaseTool):
         prettier_pkg = f"prettier@{prettier_version}"
 
         cmd = [
-            "npx",
+            resolve_executable("npx"),
             "--yes",
             prettier_pkg,
             "--write",
@@ -172,6 +263,9 @@ class A3Tool(BaseTool):
     ):
         logger.info(f"Running tool {self.name}")
 
+        # Imported lazily, numpy is only needed for the vectorized date path
+        import numpy as np
+
         try:
             # Validate inputs
             if not os.path.exists(safe_path(filename)):
@@ -187,12 +281,21 @@ class A3Tool(BaseTool):
                 )
 
             # Process dates
-            dates = safe_read(filename).splitlines()
-            weekday_count = 0
-            for date in dates:
-                parsed_date = parse(date)
-                if parsed_date.weekday() == weekday:
-                    weekday_count += 1
+            dates = [date.strip() for date in safe_read(filename).splitlines()]
+            try:
+                # numpy also accepts "20200101", "2020-01" or "today" and silently
+                # reads them differently, so only take the vectorized path when
+                # every line is a plain YYYY-MM-DD date
+                if not ISO_DATES_RE.fullmatch("\n".join(dates)):
+                    raise ValueError("Not all dates are ISO dates")
+                # 1970-01-01 was a Thursday
+                days = np.array(dates, dtype="datetime64[D]")
+                weekdays = (days.astype("int64") + 3) % 7
+                weekday_count = int((weekdays == weekday).sum())
+            except ValueError:
+                weekday_count = sum(
+                    1 for date in dates if parse_weekday(date) == weekday
+                )
 
             # Write result
             safe_write(targetfile, str(weekday_count))
@@ -245,11 +348,14 @@ class A4Tool(BaseTool):
         sort_keys=["last_name", "first_name"],
     ):
         try:
-            contacts = json.loads(safe_read(filename))
-            sorted_contacts = sorted(
-                contacts, key=lambda x: tuple(x[key] for key in sort_keys)
+            contacts = orjson.loads(safe_read(filename, "rb"))
+            # itemgetter builds the key tuple in C, avoiding a Python call per contact.
+            # The list is freshly parsed, so sort it in place rather than copying it
+            if sort_keys:
+                contacts.sort(key=itemgetter(*sort_keys))
+            safe_write_bytes(
+                targetfile, orjson.dumps(contacts, option=orjson.OPT_INDENT_2)
             )
-            safe_write(targetfile, json.dumps(sorted_contacts, indent=4))
             return ToolResponse(status=ToolStatus.SUCCESS)
         except Exception as e:
             return ToolResponse(status=ToolStatus.ERROR, message=str(e))
@@ -294,24 +400,27 @@ class A5Tool(BaseTool):
         extension="log",
     ):
         try:
-            log_dir = Path(safe_path(log_dir_path))
-            output_file = Path(safe_path(output_file_path))
-
             # Strip any leading dots from extension
-            extension = extension.lstrip(".")
-
-            log_files = sorted(
-                log_dir.glob(f"*.{extension}"), key=os.path.getmtime, reverse=True
-            )[:num_files]
-
-            with output_file.open("w") as f_out:
-                for i, log_file in enumerate(log_files):
-                    with log_file.open("r") as f_in:
-                        first_line = f_in.readline().strip()
-                        if i < len(log_files) - 1:
-                            f_out.write(f"{first_line}\n")
-                        else:
-                            f_out.write(first_line)
+            suffix = f".{extension.lstrip('.')}"
+
+            # Single scandir pass, then keep only the newest num_files entries.
+            # Filter on name and d_type first so only matching files are stat'ed
+            with os.scandir(safe_path(log_dir_path)) as it:
+                entries = [
+                    (entry.stat().st_mtime, entry.path)
+                    for entry in it
+                    if entry.name.endswith(suffix) and entry.is_file()
+                ]
+            log_files = [path for _, path in heapq.nlargest(num_files, entries)]
+
+            # Read the first lines concurrently, order is kept by map
+            max_workers = io_worker_count(len(log_files), constants.IO_MAX_WORKERS)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                first_lines = list(executor.map(read_first_line, log_files))
+
+            safe_write(
+                output_file_path, "\n".join(line.strip() for line in first_lines)
+            )
             return ToolResponse(status=ToolStatus.SUCCESS)
         except Exception as e:
             return ToolResponse(status=ToolStatus.ERROR, message=str(e))
@@ -342,23 +451,29 @@ class A6Tool(BaseTool):
     def run(self, doc_dir_path="/data/docs", output_file_path="/data/docs/index.json"):
         try:
             safe_doc_dir = safe_path(doc_dir_path)
-            index_data = {}
-            for root, _, files in os.walk(safe_doc_dir):
-                for file in files:
-                    if file.endswith(".md"):
-                        file_path = os.path.join(root, file)
-                        content = safe_read(file_path, encoding="utf-8")
-                        for line in content.splitlines():
-                            if line.startswith("# "):
-                                title = line[2:].strip()
-                                relative_path = os.path.relpath(
-                                    file_path, safe_doc_dir
-                                ).replace("\\", "/")
-                                index_data[relative_path] = title
-                                break
+            file_paths = [
+                os.path.join(root, file)
+                for root, _, files in os.walk(safe_doc_dir)
+                for file in files
+                if file.endswith(".md")
+            ]
 
-            safe_write(
-                output_file_path, json.dumps(index_data, indent=4), encoding="utf-8"
+            # Extract titles concurrently, order is kept by map
+            max_workers = io_worker_count(len(file_paths), constants.IO_MAX_WORKERS)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                titles = list(executor.map(read_markdown_title, file_paths))
+
+            index_data = {}
+            for file_path, title in zip(file_paths, titles):
+                if title is not None:
+                    relative_path = os.path.relpath(file_path, safe_doc_dir)
+                    index_data[relative_path.replace("\\", "/")] = title
+
+            safe_write_bytes(
+                output_file_path,
+                orjson.dumps(
+                    index_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+                ),
             )
             return ToolResponse(status=ToolStatus.SUCCESS)
         except Exception as e:
@@ -389,7 +504,33 @@ class A7Tool(BaseTool):
 
     def run(self, filename="/data/email.txt", output_file="/data/email-sender.txt"):
         try:
-            email_content = safe_read(filename)
+            # The sender is in the From: header, scan only the start of the file.
+            # Empty files can't be mapped, they go straight to the LLM below
+            from_header = header_block = None
+            if os.path.getsize(safe_path(filename)):
+                with safe_read_mmap(filename) as mm:
+                    scan_end = min(mm.size(), constants.EMAIL_HEADER_SCAN_BYTES)
+                    blank_line = HEADER_END_RE.search(mm, 0, scan_end)
+                    header_end = blank_line.start() if blank_line else scan_end
+                    match = FROM_HEADER_RE.search(mm, 0, header_end)
+                    if match:
+                        from_header = HEADER_FOLD_RE.sub(
+                            " ", match.group().decode(errors="replace")
+                        )
+                    if blank_line:
+                        header_block = mm[:header_end].decode(errors="replace")
+
+            if from_header:
+                address = ANGLE_ADDRESS_RE.search(from_header)
+                address = address or BARE_ADDRESS_RE.search(from_header)
+                if address:
+                    # Well-formed sender address, no need to ask the LLM
+                    safe_write(output_file, address.group(1))
+                    return ToolResponse(status=ToolStatus.SUCCESS)
+
+            # Let the LLM look at the whole header block, or the whole email if the
+            # header block couldn't be found
+            email_content = header_block or safe_read(filename)
 
             messages = [
                 {
@@ -407,6 +548,7 @@ class A7Tool(BaseTool):
             sender_email = response.choices[0].message.content.strip()
 
             safe_write(output_file, sender_email)
+            accept_completion(messages, [], response)
             return ToolResponse(status=ToolStatus.SUCCESS)
         except Exception as e:
             return ToolResponse(status=ToolStatus.ERROR, message=str(e))
@@ -457,8 +599,7 @@ class A8Tool(BaseTool):
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/png;base64,"
-                                f"{png_to_base64(safe_path(input_image_path))}"
+                                "url": png_to_data_url(safe_path(input_image_path))
                             },
                         },
                     ],
@@ -473,6 +614,7 @@ class A8Tool(BaseTool):
                 raise ValueError("Invalid credit card number format")
 
             safe_write(filename, card_number)
+            accept_completion(messages, [], response)
             return ToolResponse(status=ToolStatus.SUCCESS)
         except Exception as e:
             return ToolResponse(status=ToolStatus.ERROR, message=str(e))
@@ -505,22 +647,49 @@ class A9Tool(BaseTool):
         filename="/data/comments.txt",
         output_filename="/data/comments-similar.txt",
     ):
+        # Imported lazily, numpy is only needed for the similarity search
+        import numpy as np
+
         try:
             # Read comments from file
             comments = safe_read(filename).splitlines()
 
-            # Get embeddings using OpenAI API
-            response = get_embedding(comments)
-            embeddings = [emb.embedding for emb in response.data]
-
-            # Calculate similarity matrix using dot product
-            similarity = np.dot(embeddings, np.transpose(embeddings))
-
-            # Mask diagonal to ignore self-similarity
-            np.fill_diagonal(similarity, -np.inf)
-
-            # Find indices of most similar pair
-            i, j = np.unravel_index(similarity.argmax(), similarity.shape)
+            # A repeated comment is trivially the most similar pair, skip embedding
+            seen = set()
+            for comment in comments:
+                if comment.strip() and comment in seen:
+                    safe_write(output_filename, f"{comment}\n{comment}")
+                    return ToolResponse(status=ToolStatus.SUCCESS)
+                seen.add(comment)
+
+            # Get embeddings using OpenAI API (batched requests)
+            embeddings = get_embedding(comments)
+
+            # L2-normalize so the dot product is the cosine similarity
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+            # Find indices of most similar pair, one block of rows at a time
+            # so the full N x N similarity matrix is never materialized
+            block_size = constants.SIMILARITY_BLOCK_SIZE
+            n = len(matrix)
+            # One scratch buffer for every block, the matmul writes into it directly
+            buffer = np.empty(min(block_size, n) * n, dtype=np.float32)
+            best, i, j = -np.inf, 0, 0
+            for start in range(0, n, block_size):
+                # Similarity is symmetric, only compare against the later rows
+                block = matrix[start : start + block_size]
+                rows, cols = len(block), n - start
+                similarity = buffer[: rows * cols].reshape(rows, cols)
+                np.matmul(block, matrix[start:].T, out=similarity)
+
+                # Mask the diagonal and lower triangle to ignore self-similarity
+                # and pairs already compared
+                similarity[np.tril_indices(rows, 0, cols)] = -np.inf
+
+                row, col = np.unravel_index(similarity.argmax(), similarity.shape)
+                if similarity[row, col] > best:
+                    best, i, j = similarity[row, col], start + row, start + col
 
             # Write the similar comments to output file
             similar_comments = sorted([comments[i], comments[j]])
@@ -562,15 +731,13 @@ class A10Tool(BaseTool):
         query="SELECT SUM(units * price) FROM tickets WHERE type = 'Gold'",
     ):
         try:
-            conn = sqlite3.connect(safe_path(filename))
-            cursor = conn.cursor()
-
-            cursor.execute(query)
+            db_path = safe_path(filename)
+            conn = sqlite_connection(db_path, os.stat(db_path).st_mtime_ns)
+            cursor = conn.execute(query)
             total_sales = cursor.fetchone()[0] or 0
 
             safe_write(output_filename, str(total_sales))
 
-            conn.close()
             return ToolResponse(status=ToolStatus.SUCCESS)
         except Exception as e:
             return ToolResponse(status=ToolStatus.ERROR, message=str(e))
@@ -1,9 +1,14 @@
+import hashlib
 import json
 import logging
+import os
+
+import orjson
 from base import BaseTool, ToolResponse, ToolStatus
-from llm import ask_llm
+from llm import accept_completion, ask_llm
 import constants
 import subprocess
+from utils import resolve_executable
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +52,22 @@ SYSTEM_PROMPT = (
 )
 
 
+def parse_llm_json(llm_raw_response: str) -> dict:
+    """Parse the JSON object in an LLM response, ignoring any ```json fences."""
+    # Slice from the first "{" to the last "}" instead of stripping the fences
+    start = llm_raw_response.find("{")
+    end = llm_raw_response.rfind("}")
+    if start != -1 and end > start:
+        llm_raw_response = llm_raw_response[start : end + 1]
+
+    try:
+        return orjson.loads(llm_raw_response)
+    except orjson.JSONDecodeError:
+        # Trailing text containing "}" ends up in the slice, stop at the first object
+        parsed_response, _ = json.JSONDecoder().raw_decode(llm_raw_response)
+        return parsed_response
+
+
 class CodeRunnerTool(BaseTool):
     name = "code_runner"
     description = (
@@ -66,6 +87,21 @@ class CodeRunnerTool(BaseTool):
         "required": ["user_instruction"],
     }
 
+    def __init__(self):
+        # Hashes of setup scripts that already succeeded, persisted across restarts
+        self.setup_done = set()
+        if os.path.exists(constants.CODE_RUNNER_SETUP_CACHE_FILE):
+            with open(constants.CODE_RUNNER_SETUP_CACHE_FILE) as f:
+                self.setup_done.update(f.read().split())
+
+    def mark_setup_done(self, setup_key: str):
+        self.setup_done.add(setup_key)
+        try:
+            with open(constants.CODE_RUNNER_SETUP_CACHE_FILE, "a") as f:
+                f.write(f"{setup_key}\n")
+        except OSError as e:
+            logger.warning(f"Could not persist setup cache: {e}")
+
     def run_subprocess(self, code: str, application_type: str) -> (bool, str):
         """
         Run the given code in a subprocess, using Python or Bash.
@@ -79,12 +115,15 @@ class CodeRunnerTool(BaseTool):
         if application_type == "python":
             # Run Python script from STDIN
             result = subprocess.run(
-                ["python"], input=code, capture_output=True, text=True
+                [resolve_executable("python")],
+                input=code,
+                capture_output=True,
+                text=True,
             )
         elif application_type == "bash":
             # Run Bash script from STDIN
             result = subprocess.run(
-                ["bash"], input=code, capture_output=True, text=True
+                [resolve_executable("bash")], input=code, capture_output=True, text=True
             )
         else:
             return False, f"Unknown application_type: {application_type}"
@@ -129,14 +168,9 @@ class CodeRunnerTool(BaseTool):
             logger.info(f"LLM Response: {response}")
             llm_raw_response = response.choices[0].message.content
 
-            # Remove any ```json and ``` markers if present
-            llm_raw_response = (
-                llm_raw_response.replace("```json", "").replace("```", "").strip()
-            )
-
             # Attempt to parse the JSON
             try:
-                parsed_response = json.loads(llm_raw_response)
+                parsed_response = parse_llm_json(llm_raw_response)
             except json.JSONDecodeError:
                 # If we cannot parse, add error to context and try again
                 error_msg = (
@@ -150,23 +184,33 @@ class CodeRunnerTool(BaseTool):
             task_code = parsed_response.get("task_code", "")
             setup_code = parsed_response.get("setup_code", "")
 
-            # Run setup code if provided
+            # Run setup code if provided, skipping scripts that already succeeded
             if setup_code:
-                setup_success, setup_output = self.run_subprocess(setup_code, "bash")
-                if not setup_success:
-                    logger.error(f"Setup failed with error:\n{setup_output}")
-                    context += (
-                        f"\nSetup script failed:\n{setup_code}\n"
-                        f"Error:\n{setup_output}\n"
-                        f"Please fix the setup script accordingly."
+                setup_key = hashlib.blake2b(
+                    setup_code.encode(), digest_size=16
+                ).hexdigest()
+                if setup_key in self.setup_done:
+                    logger.info("Setup script already ran successfully, skipping")
+                else:
+                    setup_success, setup_output = self.run_subprocess(
+                        setup_code, "bash"
                     )
-                    continue
+                    if not setup_success:
+                        logger.error(f"Setup failed with error:\n{setup_output}")
+                        context += (
+                            f"\nSetup script failed:\n{setup_code}\n"
+                            f"Error:\n{setup_output}\n"
+                            f"Please fix the setup script accordingly."
+                        )
+                        continue
+                    self.mark_setup_done(setup_key)
 
             # Run the main code in a subprocess (in-memory)
             success, output_or_error = self.run_subprocess(task_code, application_type)
 
             if success:
                 logger.info(f"Script succeeded on iteration {iteration}")
+                accept_completion(messages, [], response)
                 return ToolResponse(
                     status=ToolStatus.SUCCESS,
                     data={"output": output_or_error, "iterations": iteration},
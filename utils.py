@@ -1,8 +1,42 @@
 import os
 import base64
+import functools
+import mmap
+import re
+import shutil
+import threading
+from collections import OrderedDict
+
+import constants
 
 is_local = False
 
+# Leading "data/" (or "data") component, stripped before re-rooting a path
+DATA_PREFIX_RE = re.compile(r"^data/?")
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with a fixed number of entries."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
 
 def safe_path(path: str) -> str:
     """Safely handle file paths to prevent directory traversal.
@@ -14,18 +48,18 @@ def safe_path(path: str) -> str:
     Returns:
         Safe file path string
     """
+    return _safe_path(path, is_local)
+
+
+@functools.lru_cache(maxsize=512)
+def _safe_path(path: str, local: bool) -> str:
     # Remove any parent directory references
     clean_path = os.path.normpath(path).lstrip("/")
 
     # Only allow paths under /data
-    if clean_path.startswith("data/"):
-        clean_path = clean_path[5:]
-    elif clean_path.startswith("data"):
-        clean_path = clean_path[4:]
+    clean_path = DATA_PREFIX_RE.sub("", clean_path, count=1)
 
-    if is_local:
-        return os.path.join("./data", clean_path)
-    return os.path.join("/data", clean_path)
+    return os.path.join("./data" if local else "/data", clean_path)
 
 
 def safe_read(path: str, *args, **kwargs):
@@ -35,6 +69,14 @@ def safe_read(path: str, *args, **kwargs):
         return f.read()
 
 
+def safe_iter_chunks(path: str, chunk_size: int = 1 << 16):
+    """Safely read a file from the data directory in binary chunks."""
+    safe_file_path = safe_path(path)
+    with open(safe_file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
 def safe_write(path: str, data, *args, **kwargs):
     """Safely write a file to the data directory."""
     safe_file_path = safe_path(path)
@@ -43,7 +85,71 @@ def safe_write(path: str, data, *args, **kwargs):
         return f.write(data)
 
 
+def safe_write_bytes(path: str, data: bytes):
+    """Safely write bytes to a file in the data directory."""
+    safe_file_path = safe_path(path)
+    os.makedirs(os.path.dirname(safe_file_path), exist_ok=True)
+    with open(safe_file_path, "wb") as f:
+        return f.write(data)
+
+
+def read_first_line(path, size: int = 4096) -> str:
+    """Read the first line of a file with a single pread of its first page."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        buf = os.pread(fd, size, 0)
+    finally:
+        os.close(fd)
+    return buf.split(b"\n", 1)[0].decode("utf-8", errors="replace")
+
+
+def safe_read_mmap(path: str) -> mmap.mmap:
+    """Safely memory-map a file from the data directory for reading."""
+    safe_file_path = safe_path(path)
+    with open(safe_file_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_markdown_title(path) -> str | None:
+    """Return the first H1 title of a markdown file without splitting it into lines."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < constants.MMAP_MIN_BYTES:
+            # Small files are cheaper to read in one call than to map
+            return _find_markdown_title(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _find_markdown_title(mm)
+
+
+def _find_markdown_title(content) -> str | None:
+    if content[:2] == b"# ":
+        start = 0
+    else:
+        start = content.find(b"\n# ") + 1
+        if not start:
+            return None
+    end = content.find(b"\n", start)
+    line = content[start : end if end != -1 else len(content)]
+    return line[2:].decode("utf-8").strip()
+
+
+def io_worker_count(num_tasks: int, max_workers: int) -> int:
+    """Threads to use for num_tasks blocking file reads, never more than needed."""
+    return max(1, min(max_workers, (os.cpu_count() or 1) * 4, num_tasks))
+
+
+@functools.cache
+def resolve_executable(name: str) -> str:
+    """Resolve a command to an absolute path so subprocess can use posix_spawn."""
+    return shutil.which(name) or name
+
+
 def png_to_base64(image_path):
+    # Encode straight from a memory map to avoid copying the file into memory first
     with open(image_path, "rb") as image_file:
-        base64_string = base64.b64encode(image_file.read()).decode("utf-8")
+        with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            base64_string = base64.b64encode(mm).decode("ascii")
     return base64_string
+
+
+def png_to_data_url(image_path):
+    return "data:image/png;base64," + png_to_base64(image_path)